@@ -0,0 +1,23 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Usage: gunicorn src.api.main:app  (this file is picked up from the working directory)
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '6060')}"
+workers = int(os.getenv("WORKERS", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app in the master so the model loaded below is shared copy-on-write by forked workers
+preload_app = True
+
+def on_starting(server):
+    # TensorFlow runtime state is not fork-safe. The ONNX backend builds only its ORT session here; the first-boot
+    # SavedModel export runs in a child process, so the master never starts TensorFlow. The TensorFlow
+    # backend is still loaded by each worker at startup.
+    from src.api.routes.fraud_detection import get_fraud_model
+    from src.utils import ai_config
+
+    if ai_config.FRAUD_MODEL_BACKEND == "onnx":
+        get_fraud_model()
@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 import uvicorn
 
 from src.api.routes import fraud_detection_router
@@ -8,7 +9,8 @@ from src.utils import ai_config
 app = FastAPI(
     title="PlayStudios Fraud Detection API",
     description="API for fraud detection",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -20,4 +22,5 @@ app.add_middleware(
 app.include_router(fraud_detection_router)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=ai_config.HOST, port=ai_config.PORT)
\ No newline at end of file
+    # Production: gunicorn src.api.main:app (see gunicorn.conf.py)
+    uvicorn.run("src.api.main:app", host=ai_config.HOST, port=ai_config.PORT, workers=ai_config.WORKERS)
\ No newline at end of file
@@ -1,24 +1,148 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import logging
+from functools import lru_cache
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 import numpy as np
+import simdjson
 
 from src.api.models import FraudDetectionRequest, FraudDetectionResponse
-from src.core.fraud_model import FraudDetectionModel
-from src.utils import get_logger
+from src.core.fraud_model import N_FEATURES, FraudDetectionModel
+from src.utils import get_logger, ai_config
 
 logger = get_logger(__name__)
 
-fraud_model = FraudDetectionModel()
-
 router = APIRouter(tags=["fraud_detection"])
 
-@router.post("/detect")
-async def detect_fraud(request: FraudDetectionRequest):
+batch_queue: asyncio.Queue[tuple[np.ndarray, asyncio.Future]] = asyncio.Queue()
+_batch_worker_task: asyncio.Task | None = None
+# One parser per worker, only used from the event loop thread
+_json_parser = simdjson.Parser()
+
+@lru_cache(maxsize=1)
+def get_fraud_model() -> FraudDetectionModel:
+    # Loaded lazily: in the gunicorn master when preloading (see gunicorn.conf.py), otherwise per worker
+    return FraudDetectionModel()
+
+async def _batch_worker() -> None:
+    # Stack queued requests into one batch per model call and fan the results back out
+    loop = asyncio.get_running_loop()
+    fraud_model = get_fraud_model()
+    batch_timeout = ai_config.BATCH_TIMEOUT_MS / 1000
+
+    while True:
+        items = [await batch_queue.get()]
+        n_rows = len(items[0][0])
+        deadline = loop.time() + batch_timeout
+        while n_rows < ai_config.MAX_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(batch_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            items.append(item)
+            n_rows += len(item[0])
+
+        try:
+            # The model copies the rows straight into its preallocated input buffer
+            results = await run_in_threadpool(fraud_model.predict, [features for features, _ in items])
+        except Exception as e:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            continue
+
+        offset = 0
+        for features, future in items:
+            # Skip requests that were cancelled while waiting
+            if not future.done():
+                future.set_result(results[offset:offset + len(features)])
+            offset += len(features)
+
+@router.on_event("startup")
+def load_fraud_model() -> None:
+    get_fraud_model()
+
+@router.on_event("startup")
+async def start_batch_worker() -> None:
+    global _batch_worker_task
+    # FastAPI runs an included router's startup handlers twice (copied onto the app and again through
+    # the router's own lifespan); a second worker would split every batch in two
+    if _batch_worker_task is None:
+        _batch_worker_task = asyncio.create_task(_batch_worker())
+
+@router.on_event("shutdown")
+async def stop_batch_worker() -> None:
+    global _batch_worker_task
+    if _batch_worker_task is not None:
+        _batch_worker_task.cancel()
+        _batch_worker_task = None
+
+def _parse_features_with_pydantic(body: bytes) -> np.ndarray:
+    # Slow path for valid JSON that simdjson cannot represent
+    rows = FraudDetectionRequest.model_validate_json(body).features
+    if len(rows) == 0:
+        raise ValueError(f"Expected features of shape (batch, {N_FEATURES})")
+    for i, row in enumerate(rows):
+        if len(row) != N_FEATURES:
+            raise ValueError(f"Expected features of shape (batch, {N_FEATURES}), row {i} is invalid")
+    return np.array(rows, dtype=np.float32)
+
+def _parse_features(body: bytes) -> np.ndarray:
+    # Rows are copied from simdjson's buffer straight into float32 without building Python floats
+    doc = rows = row = None
+    try:
+        try:
+            doc = _json_parser.parse(body)
+        except RuntimeError:
+            # simdjson rejects integers that do not fit in 64 bits, which are still valid JSON numbers
+            return _parse_features_with_pydantic(body)
+        rows = doc["features"]
+        if not isinstance(rows, simdjson.Array) or len(rows) == 0:
+            raise ValueError(f"Expected features of shape (batch, {N_FEATURES})")
+        # as_buffer flattens nested arrays, so a 2-D batch has exactly one '[' per row plus the outer one
+        if rows.mini.count(b"[") != len(rows) + 1:
+            raise ValueError(f"Expected features of shape (batch, {N_FEATURES}), rows must contain only numbers")
+
+        features = np.empty((len(rows), N_FEATURES), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if not isinstance(row, simdjson.Array) or len(row) != N_FEATURES:
+                raise ValueError(f"Expected features of shape (batch, {N_FEATURES}), row {i} is invalid")
+            features[i] = np.frombuffer(row.as_buffer(of_type="d"), dtype=np.float64)
+    finally:
+        # The parser refuses to parse again while proxies into its last document are alive
+        doc = rows = row = None
+    return features
+
+@router.post(
+    "/detect",
+    response_model=FraudDetectionResponse,
+    # The body is parsed by hand, so document the schema the pydantic model would have produced
+    openapi_extra={
+        "requestBody": {
+            "content": {"application/json": {"schema": FraudDetectionRequest.model_json_schema()}},
+            "required": True,
+        }
+    },
+)
+async def detect_fraud(request: Request):
+    try:
+        input_data = _parse_features(await request.body())
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning("Invalid fraud detection request: %s", e)
+        raise HTTPException(status_code=422, detail=str(e))
+
     try:
-        logger.info(f"Detecting fraud for features: {len(request.features)} features")
-        input_data = np.array(request.features).astype("float32")
-        result = fraud_model.predict(input_data)
-        logger.info(f"Fraud detection result: {result}")
+        logger.info("Detecting fraud for %d feature rows", len(input_data))
+        future = asyncio.get_running_loop().create_future()
+        await batch_queue.put((input_data, future))
+        result = await future
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Fraud detection result: %s", result)
         return FraudDetectionResponse(result=result)
     except Exception as e:
-        logger.error(f"Error detecting fraud: {e}")
+        logger.error("Error detecting fraud: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
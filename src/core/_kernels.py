@@ -0,0 +1,15 @@
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def threshold(probs: np.ndarray, thr: float) -> np.ndarray:
+    # Single pass over the probabilities, no intermediate boolean array
+    binary = np.empty(probs.shape[0], dtype=np.int8)
+    for i in range(probs.shape[0]):
+        binary[i] = 1 if probs[i] > thr else 0
+    return binary
+
+
+# Compile at import for the model's float32 output so no request pays the JIT cost
+threshold(np.zeros(1, dtype=np.float32), 0.5)
@@ -1,21 +1,75 @@
+import hashlib
+import json
+import os
 import shutil
+import subprocess
+import sys
+import threading
 import numpy as np
+import onnx
+import onnxruntime as ort
+import tensorflow as tf
+from google.protobuf.message import DecodeError
+from onnxruntime.capi.onnxruntime_pybind11_state import Fail, InvalidArgument, InvalidGraph, InvalidProtobuf, NoSuchFile
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from filelock import FileLock
 from pathlib import Path
+from typing import Sequence
 from tensorflow import keras
 from huggingface_hub import snapshot_download
 
-from utils import (
+from src.utils import (
     get_logger,
     ai_config
 )
+from src.utils.config import FRAUD_THRESHOLD
+from src.core._kernels import threshold
 
 logger = get_logger(__name__)
 
+# Each server worker runs single-threaded so N workers map onto N cores without over-subscribing
+tf.config.threading.set_intra_op_parallelism_threads(1)
+tf.config.threading.set_inter_op_parallelism_threads(1)
+
+SUPPORTED_BACKENDS = ("onnx", "tensorflow")
+N_FEATURES = 30
+# Missing or corrupt model files; a fresh download, which also wipes the cached ONNX exports, can fix these
+MODEL_LOAD_ERRORS = (
+    OSError,
+    subprocess.CalledProcessError,
+    ValueError,
+    DecodeError,
+    tf.errors.OpError,
+    Fail,
+    InvalidArgument,
+    InvalidGraph,
+    InvalidProtobuf,
+    NoSuchFile,
+)
+
 class FraudDetectionModel:
     def __init__(self) -> None:
         self.repo_id = ai_config.FRAUD_MODEL_REPO_ID
         self.model_path = ai_config.FRAUD_MODEL_LOCAL_PATH
+        self.backend = ai_config.FRAUD_MODEL_BACKEND
+        if self.backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unsupported model backend {self.backend!r}, expected one of {SUPPORTED_BACKENDS}")
+
+        self._output_key = "dense_7"
+        # Reused for every call; grown only when a batch exceeds MAX_BATCH_SIZE rows
+        self._input_buf = np.empty((ai_config.MAX_BATCH_SIZE, N_FEATURES), dtype=np.float32)
+        self._input_lock = threading.Lock()
+        self._quantize_check_features = None
+        if ai_config.FRAUD_MODEL_QUANTIZE and self.backend == "onnx":
+            self._quantize_check_features = self._load_quantize_check_features()
+
         self.model = None
+        self.sess = None
+        self.input_name = None
+        self.output_name = None
+        self._io_binding = None
+        self._concrete_fn = None
+        self._infer = None
         
         self.load_model()
 
@@ -32,11 +86,148 @@ class FraudDetectionModel:
             allow_patterns=["saved_model.pb", "variables/*", "assets/*", "keras_metadata.pb"],
         )
         logger.info(f"Model downloaded to {self.model_path} successfully")
-    
-    def initialize_model(self) -> None:
+
+    def _model_lock(self) -> FileLock:
+        # Shared by every worker that downloads, exports or quantizes into model_path
+        return FileLock(f"{Path(self.model_path)}.lock")
+
+    def _export_onnx_model(self) -> str:
+        onnx_path = Path(self.model_path, "model.onnx")
+        if onnx_path.is_file():
+            return str(onnx_path)
+        with self._model_lock():
+            # Another worker may have exported while this one waited on the lock
+            if onnx_path.is_file():
+                return str(onnx_path)
+            logger.info(f"Exporting model to ONNX at {onnx_path}")
+            # Write to a per-process temp file so a concurrent reader never sees a partial model
+            tmp_path = f"{onnx_path}.{os.getpid()}.tmp"
+            # Run the conversion in a child process so the serving process (the gunicorn master when
+            # preloading) never starts the TensorFlow runtime just to export
+            try:
+                subprocess.run(
+                    [
+                        sys.executable, "-m", "tf2onnx.convert",
+                        "--saved-model", self.model_path,
+                        "--signature_def", "serving_default",
+                        "--opset", "15",
+                        "--output", tmp_path,
+                    ],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                )
+            except subprocess.CalledProcessError as e:
+                logger.error(f"ONNX export failed:\n{e.stderr[-2000:]}")
+                raise
+            os.replace(tmp_path, onnx_path)
+        return str(onnx_path)
+
+    def _quantization_settings(self, onnx_path: str) -> dict:
+        # A per-tensor scale over the raw features is set by Time/Amount and rounds V1-V28 to zero,
+        # so the layer reading the inputs stays FP32
+        graph = onnx.load(onnx_path).graph
+        initializers = {initializer.name for initializer in graph.initializer}
+        input_names = {graph_input.name for graph_input in graph.input} - initializers
+        return {
+            "weight_type": QuantType.QInt8.name,
+            "nodes_to_exclude": [node.name for node in graph.node if input_names.intersection(node.input)],
+            "threshold": FRAUD_THRESHOLD,
+            "check_data_sha256": hashlib.sha256(self._quantize_check_features.tobytes()).hexdigest(),
+        }
+
+    @staticmethod
+    def _read_quantization_report(report_path: Path, settings: dict) -> float | None:
+        # The report records the settings an INT8 model was built and checked with; any other file is stale
+        try:
+            report = json.loads(report_path.read_text())
+        except (OSError, ValueError):
+            return None
+        return report["agreement"] if report.get("settings") == settings else None
+
+    def _quantize_onnx_model(self, onnx_path: str) -> tuple[str, float]:
+        int8_path = Path(self.model_path, "model.int8.onnx")
+        report_path = Path(self.model_path, "model.int8.json")
+        settings = self._quantization_settings(onnx_path)
+        agreement = self._read_quantization_report(report_path, settings)
+        if agreement is not None and int8_path.is_file():
+            return str(int8_path), agreement
+        with self._model_lock():
+            agreement = self._read_quantization_report(report_path, settings)
+            if agreement is not None and int8_path.is_file():
+                return str(int8_path), agreement
+            logger.info(f"Quantizing ONNX model to INT8 at {int8_path}")
+            tmp_path = f"{int8_path}.{os.getpid()}.tmp"
+            quantize_dynamic(
+                onnx_path, tmp_path, weight_type=QuantType[settings["weight_type"]], nodes_to_exclude=settings["nodes_to_exclude"]
+            )
+            agreement = self._int8_agreement(onnx_path, tmp_path)
+            os.replace(tmp_path, int8_path)
+
+            tmp_path = f"{report_path}.{os.getpid()}.tmp"
+            Path(tmp_path).write_text(json.dumps({"settings": settings, "agreement": agreement}))
+            os.replace(tmp_path, report_path)
+        return str(int8_path), agreement
+
+    @staticmethod
+    def _create_onnx_session(onnx_path: str) -> ort.InferenceSession:
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = 1
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(
+            onnx_path,
+            sess_options=sess_options,
+            providers=["CPUExecutionProvider"],
+        )
+
+    @staticmethod
+    def _load_quantize_check_features() -> np.ndarray:
+        # Checked before loading so a missing file fails the boot instead of triggering a re-download
+        if ai_config.FRAUD_MODEL_QUANTIZE_CHECK_CSV is None:
+            raise ValueError("FRAUD_MODEL_QUANTIZE requires FRAUD_MODEL_QUANTIZE_CHECK_CSV")
+        check_csv = Path(ai_config.FRAUD_MODEL_QUANTIZE_CHECK_CSV)
+        # Columns are Time, V1-V28, Amount, Class; the first 30 are the model inputs
+        features = np.loadtxt(check_csv, delimiter=",", skiprows=1, usecols=range(N_FEATURES), dtype=np.float32, ndmin=2)
+        if len(features) == 0:
+            raise ValueError(f"INT8 check data {check_csv} is empty")
+        return features
+
+    def _int8_agreement(self, fp32_path: str, int8_path: str) -> float:
+        features = self._quantize_check_features
+        fp32_sess = self._create_onnx_session(fp32_path)
+        int8_sess = self._create_onnx_session(int8_path)
+        input_name = fp32_sess.get_inputs()[0].name
+
+        expected = fp32_sess.run(None, {input_name: features})[0] > FRAUD_THRESHOLD
+        # Dynamic quantization scales depend on the whole batch, so check batched and single-row scoring
+        batched = int8_sess.run(None, {input_name: features})[0] > FRAUD_THRESHOLD
+        single = np.vstack([int8_sess.run(None, {input_name: features[i:i + 1]})[0] for i in range(len(features))]) > FRAUD_THRESHOLD
+
+        agreement = min(float((batched == expected).mean()), float((single == expected).mean()))
+        logger.info(f"INT8 model agrees with FP32 on {agreement:.2%} of {len(features)} check rows")
+        return agreement
+
+    def _initialize_onnx_session(self) -> None:
+        onnx_path = self._export_onnx_model()
+        if self._quantize_check_features is not None:
+            int8_path, agreement = self._quantize_onnx_model(onnx_path)
+            if agreement >= ai_config.FRAUD_MODEL_QUANTIZE_MIN_AGREEMENT:
+                onnx_path = int8_path
+            else:
+                logger.warning(
+                    f"INT8 model agrees with FP32 on only {agreement:.2%} of the check rows, serving the FP32 model"
+                )
+
+        self.sess = self._create_onnx_session(onnx_path)
+        self.input_name = self.sess.get_inputs()[0].name
+        self.output_name = self.sess.get_outputs()[0].name
+        self._io_binding = self.sess.io_binding()
+        self._infer = self._run_onnx
+
+    def _initialize_tf_function(self) -> None:
         self.model = keras.Sequential(
             [
-                keras.layers.Input(shape=(30,)),
+                keras.layers.Input(shape=(N_FEATURES,)),
                 keras.layers.TFSMLayer(
                     self.model_path,
                     call_endpoint="serving_default"
@@ -44,24 +235,82 @@ class FraudDetectionModel:
             ]
         )
 
+        # Trace once so each request is a single graph call instead of going through Model.predict
+        @tf.function(input_signature=[tf.TensorSpec([None, N_FEATURES], tf.float32)])
+        def _infer(x):
+            return self.model(x, training=False)
+
+        self._concrete_fn = _infer.get_concrete_function()
+        self._infer = self._run_tf_function
+
+    def initialize_model(self) -> None:
+        if self.backend == "onnx":
+            self._initialize_onnx_session()
+        else:
+            self._initialize_tf_function()
+
+    def _run_onnx(self, features: np.ndarray) -> np.ndarray:
+        # Bind the input buffer's memory directly so ORT does not copy it into its own tensor
+        self._io_binding.bind_input(
+            self.input_name, "cpu", 0, np.float32, list(features.shape), features.ctypes.data
+        )
+        # Rebound every call: a bound output keeps its first shape and would reject a different batch size
+        self._io_binding.bind_output(self.output_name, "cpu")
+        self.sess.run_with_iobinding(self._io_binding)
+        return self._io_binding.copy_outputs_to_cpu()[0]
+
+    def _run_tf_function(self, features: np.ndarray) -> np.ndarray:
+        return self._concrete_fn(tf.constant(features))[self._output_key].numpy()
+
+    def _is_model_downloaded(self) -> bool:
+        return Path(self.model_path, "saved_model.pb").is_file()
+
+    def _downloaded_version(self) -> tuple[int, int] | None:
+        # Every download recreates saved_model.pb, so its inode and mtime identify one download
+        try:
+            stat = Path(self.model_path, "saved_model.pb").stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _ensure_model_downloaded(self, failed_version: tuple[int, int] | None = None) -> None:
+        # failed_version forces a re-download of the files that failed to load, unless another
+        # worker has already replaced them
+        if failed_version is None and self._is_model_downloaded():
+            return
+        # Only one worker downloads; the others wait on the lock and then reuse its download
+        with self._model_lock():
+            version = self._downloaded_version()
+            if version is None or version == failed_version:
+                self._download_model()
+
     def load_model(self) -> None:
         logger.info(f"Loading model from {self.model_path}")
+        self._ensure_model_downloaded()
+        version = self._downloaded_version()
         try:
             self.initialize_model()
-        except:
-            logger.warning(f"Failed to load model from {self.model_path}. Trying to download again...")
-            self._download_model()
+        except MODEL_LOAD_ERRORS as e:
+            logger.warning(f"Failed to load model from {self.model_path} ({e}). Trying to download again...")
+            self._ensure_model_downloaded(failed_version=version)
             self.initialize_model()
-        finally:
-            if self.model is None:
-                raise RuntimeError("Model failed to load.")
-            logger.info(f"Model loaded from {self.model_path} successfully")
+        logger.info(f"Model loaded from {self.model_path} successfully")
+
+    def predict(self, features: np.ndarray | Sequence[np.ndarray]) -> list[int]:
+        # Accepts one (B, 30) array or a list of them that together form the batch
+        if isinstance(features, np.ndarray):
+            features = (features,)
+        n_rows = sum(len(rows) for rows in features)
 
-    def predict(self, features: np.ndarray) -> np.ndarray:
-        probabilities = self.model.predict(features, verbose=0)
-        list_prob = probabilities["dense_7"][0].tolist()
+        with self._input_lock:
+            if n_rows > len(self._input_buf):
+                self._input_buf = np.empty((n_rows, N_FEATURES), dtype=np.float32)
+            batch = self._input_buf[:n_rows]
+            np.concatenate(features, out=batch)
+            probabilities = self._infer(batch)
 
-        binary_result = [1 if prob > ai_config.FRAUD_THRESHOLD else 0 for prob in list_prob]
+        # One result per input row
+        binary_result = threshold(probabilities.reshape(-1), FRAUD_THRESHOLD).tolist()
         return binary_result
 
 
@@ -13,12 +13,21 @@ class AIConfig(BaseSettings):
         env_ignore_empty=True,
         extra="ignore",
     )
-    FRAUD_MODEL_LOCAL_PATH: str = os.getenv("FRAUD_MODEL_LOCAL_PATH") 
-    FRAUD_MODEL_REPO_ID: str = os.getenv("FRAUD_MODEL_REPO_ID")
-    FRAUD_THRESHOLD: float = float(os.getenv("FRAUD_THRESHOLD"))
+    FRAUD_MODEL_LOCAL_PATH: str
+    FRAUD_MODEL_REPO_ID: str
+    FRAUD_THRESHOLD: float = 0.5
+    FRAUD_MODEL_BACKEND: str = "onnx"
+    FRAUD_MODEL_QUANTIZE: bool = False
+    FRAUD_MODEL_QUANTIZE_CHECK_CSV: str | None = None
+    FRAUD_MODEL_QUANTIZE_MIN_AGREEMENT: float = 1.0
+    MAX_BATCH_SIZE: int = 256
+    BATCH_TIMEOUT_MS: float = 2
     
-    HOST: str = os.getenv("HOST")
-    PORT: int = int(os.getenv("PORT"))
+    HOST: str = "0.0.0.0"
+    PORT: int = 6060
+    WORKERS: int = os.cpu_count() or 1
 
 ai_config = AIConfig()
+# Plain float for the inference hot path
+FRAUD_THRESHOLD: float = ai_config.FRAUD_THRESHOLD
 logger.info("Successfully loaded AI config")
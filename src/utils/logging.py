@@ -1,7 +1,40 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 
-logging.basicConfig(level=logging.INFO)
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Handlers do their I/O on the listener thread so logging never blocks the event loop
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+# QueueHandler.prepare() bakes its own formatting into the record, so only the stream handler adds the prefix
+_queue_handler.setFormatter(logging.Formatter("%(message)s"))
+_listener = None
+
+def _start_listener() -> None:
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, _stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener() -> None:
+    _listener.stop()
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[_queue_handler],
+)
+_start_listener()
+atexit.register(_stop_listener)
+# The listener thread does not survive fork (gunicorn --preload), so each child starts its own
+os.register_at_fork(after_in_child=_start_listener)
 
 def get_logger(name: str) -> logging.Logger:
     logger = logging.getLogger(name)
-    return logger
\ No newline at end of file
+    return logger
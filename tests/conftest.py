@@ -0,0 +1,72 @@
+"""Shared fixtures: a small stand-in ONNX model served from a temporary model directory."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper, numpy_helper
+
+from src.core.fraud_model import N_FEATURES, FraudDetectionModel
+from src.utils import ai_config
+
+
+def _write_onnx_model(path: str) -> None:
+    """Write a two-layer model with the same input/output signature as the served model."""
+    initializers = [
+        numpy_helper.from_array(np.full((N_FEATURES, 8), 0.1, dtype=np.float32), "hidden_weights"),
+        numpy_helper.from_array(np.full((8, 1), 0.1, dtype=np.float32), "output_weights"),
+        numpy_helper.from_array(np.array([-0.5], dtype=np.float32), "output_bias"),
+    ]
+    graph = helper.make_graph(
+        [
+            helper.make_node("MatMul", ["input", "hidden_weights"], ["hidden"], name="hidden_matmul"),
+            helper.make_node("Relu", ["hidden"], ["hidden_relu"], name="hidden_relu"),
+            helper.make_node("MatMul", ["hidden_relu", "output_weights"], ["logits"], name="output_matmul"),
+            helper.make_node("Add", ["logits", "output_bias"], ["biased_logits"], name="output_add"),
+            helper.make_node("Sigmoid", ["biased_logits"], ["dense_7"], name="output_sigmoid"),
+        ],
+        "fraud_stub",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [None, N_FEATURES])],
+        [helper.make_tensor_value_info("dense_7", TensorProto.FLOAT, [None, 1])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 15)], ir_version=8)
+    onnx.save(model, path)
+
+
+def _write_saved_model(model_dir: str) -> None:
+    """Write a placeholder saved_model.pb as a new file, the way a fresh download does."""
+    saved_model_path = Path(model_dir, "saved_model.pb")
+    tmp_path = f"{saved_model_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"saved model")
+    os.replace(tmp_path, saved_model_path)
+
+
+@pytest.fixture
+def downloads(monkeypatch) -> list:
+    """Replace the Hugging Face download with one that writes a fresh stand-in model; records each call."""
+    calls = []
+
+    def _download(self):
+        calls.append(self.model_path)
+        _write_saved_model(self.model_path)
+        _write_onnx_model(str(Path(self.model_path, "model.onnx")))
+
+    monkeypatch.setattr(FraudDetectionModel, "_download_model", _download)
+    return calls
+
+
+@pytest.fixture
+def onnx_path(tmp_path, monkeypatch, downloads) -> str:
+    """Build a FraudDetectionModel on the ONNX backend from an already downloaded and exported model."""
+    onnx_path = str(tmp_path / "model.onnx")
+    _write_saved_model(str(tmp_path))
+    _write_onnx_model(onnx_path)
+
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_LOCAL_PATH", str(tmp_path))
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_BACKEND", "onnx")
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE", False)
+    return onnx_path
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Test script for fraud detection API server.
-Reads test.csv and sends each row to the /detect endpoint.
+Reads test.csv and sends its rows to the /detect endpoint in batches.
 
 Usage:
     python tests/test_api.py --host localhost --port 8000
@@ -11,97 +11,101 @@ import argparse
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Dict, Any, Tuple
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 
 
-def load_test_data(csv_path: str) -> List[Dict[str, Any]]:
-    """Load test data from CSV file using pandas."""
+def load_test_data(csv_path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Load test features and expected classes from CSV file using pandas."""
     # Read CSV file
     df = pd.read_csv(csv_path)
     
     # Define feature columns (all except Class)
     feature_columns = ['Time'] + [f'V{i}' for i in range(1, 29)] + ['Amount']
     
-    # Extract features and labels
-    test_cases = []
-    for idx, row in df.iterrows():
-        features = row[feature_columns].values.tolist()
-        expected_class = int(row['Class'])
-        
-        test_cases.append({
-            'features': [features],
-            'expected_class': expected_class
-        })
-    return test_cases
+    # Extract features and labels as whole arrays
+    features = df[feature_columns].to_numpy(dtype=np.float32)
+    expected_classes = df['Class'].to_numpy(dtype=np.int8)
+    return features, expected_classes
 
 
-def test_api(host: str, port: int, test_data: List[Dict[str, Any]], verbose: bool = False) -> Dict[str, Any]:
+def test_api(host: str, port: int, features: np.ndarray, expected_classes: np.ndarray, batch_size: int = 256, workers: int = 32, verbose: bool = False) -> Dict[str, Any]:
     """Test the fraud detection API with test data."""
     url = f"http://{host}:{port}/detect"
     
-    total = len(test_data)
+    total = len(expected_classes)
     successful = 0
     failed = 0
-    correct_predictions = 0
     
-    true_positives = 0
-    true_negatives = 0
-    false_positives = 0
-    false_negatives = 0
+    # Rows from failed requests keep -1 and never match an expected class
+    all_pred = np.full(total, -1, dtype=np.int8)
+    all_exp = expected_classes.astype(np.int8, copy=False)
     
     errors = []
     
     print(f"Testing API at {url}")
-    print(f"Total test cases: {total}")
+    print(f"Total test cases: {total} (batch size {batch_size}, {workers} concurrent requests)")
     print("-" * 80)
     
-    for idx, test_case in enumerate(test_data, 1):
-        payload = {"features": test_case['features']}
-        expected_class = test_case['expected_class']
+    session = requests.Session()
+    # Keep one pooled connection per client thread alive across batches
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    
+    processed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(session.post, url, json={"features": features[start:end].tolist()}, timeout=10): (start, end)
+            for start, end in ((start, min(start + batch_size, total)) for start in range(0, total, batch_size))
+        }
         
-        try:
-            response = requests.post(url, json=payload, timeout=10)
+        # Results are tallied here on the main thread as batches complete
+        for future in as_completed(futures):
+            start, end = futures[future]
+            processed += end - start
             
-            if response.status_code == 200:
-                successful += 1
-                result = response.json()
-                predicted_class = result['result'][0]
-                
-                # Check if prediction matches expected
-                if predicted_class == expected_class:
-                    correct_predictions += 1
-                
-                # Calculate confusion matrix values
-                if predicted_class == 1 and expected_class == 1:
-                    true_positives += 1
-                elif predicted_class == 0 and expected_class == 0:
-                    true_negatives += 1
-                elif predicted_class == 1 and expected_class == 0:
-                    false_positives += 1
-                elif predicted_class == 0 and expected_class == 1:
-                    false_negatives += 1
+            try:
+                response = future.result()
                 
-                if verbose:
-                    status = "✓" if predicted_class == expected_class else "✗"
-                    print(f"[{idx}/{total}] {status} Expected: {expected_class}, Predicted: {predicted_class}")
-                elif idx % 10 == 0:
-                    print(f"Processed {idx}/{total} samples...")
+                if response.status_code == 200:
+                    successful += end - start
+                    result = response.json()
+                    all_pred[start:end] = result['result']
                     
-            else:
-                failed += 1
-                errors.append(f"Test {idx}: HTTP {response.status_code} - {response.text}")
+                    if verbose:
+                        for idx in range(start, end):
+                            predicted_class, expected_class = all_pred[idx], all_exp[idx]
+                            status = "✓" if predicted_class == expected_class else "✗"
+                            print(f"[{idx + 1}/{total}] {status} Expected: {expected_class}, Predicted: {predicted_class}")
+                    else:
+                        print(f"Processed {processed}/{total} samples...")
+                        
+                else:
+                    failed += end - start
+                    errors.append(f"Tests {start + 1}-{end}: HTTP {response.status_code} - {response.text}")
+                    if verbose:
+                        print(f"[{start + 1}-{end}/{total}] ✗ HTTP Error {response.status_code}")
+                        
+            except requests.exceptions.RequestException as e:
+                failed += end - start
+                errors.append(f"Tests {start + 1}-{end}: {str(e)}")
                 if verbose:
-                    print(f"[{idx}/{total}] ✗ HTTP Error {response.status_code}")
-                    
-        except requests.exceptions.RequestException as e:
-            failed += 1
-            errors.append(f"Test {idx}: {str(e)}")
-            if verbose:
-                print(f"[{idx}/{total}] ✗ Request failed: {e}")
+                    print(f"[{start + 1}-{end}/{total}] ✗ Request failed: {e}")
+    
+    session.close()
+    
+    # Calculate confusion matrix values
+    correct_predictions = int((all_pred == all_exp).sum())
+    true_positives = int(((all_pred == 1) & (all_exp == 1)).sum())
+    true_negatives = int(((all_pred == 0) & (all_exp == 0)).sum())
+    false_positives = int(((all_pred == 1) & (all_exp == 0)).sum())
+    false_negatives = int(((all_pred == 0) & (all_exp == 1)).sum())
     
     # Calculate metrics
     accuracy = (correct_predictions / total * 100) if total > 0 else 0
@@ -184,6 +188,18 @@ def main():
         default=None,
         help="Path to test CSV file (default: tests/test.csv)"
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Number of rows sent per request (default: 256)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=32,
+        help="Number of concurrent requests (default: 32)"
+    )
     parser.add_argument(
         "-v", "--verbose",
         action="store_true",
@@ -217,15 +233,15 @@ def main():
     print(f"Loading test data from: {csv_path}")
     
     try:
-        test_data = load_test_data(str(csv_path))
-        print(f"Loaded {len(test_data)} test cases\n")
+        features, expected_classes = load_test_data(str(csv_path))
+        print(f"Loaded {len(expected_classes)} test cases\n")
     except Exception as e:
         print(f"Error loading test data: {e}", file=sys.stderr)
         sys.exit(1)
     
     # Run tests
     try:
-        results = test_api(args.host, args.port, test_data, args.verbose)
+        results = test_api(args.host, args.port, features, expected_classes, args.batch_size, args.workers, args.verbose)
     except KeyboardInterrupt:
         print("\n\nTest interrupted by user.")
         sys.exit(1)
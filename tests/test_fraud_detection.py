@@ -0,0 +1,185 @@
+"""Tests for /detect request parsing and the micro-batching worker behind it."""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.main import app
+from src.api.routes import fraud_detection
+from src.api.routes.fraud_detection import _parse_features
+from src.core.fraud_model import N_FEATURES
+from src.utils import ai_config
+
+# Not entered as a context manager, so startup does not load the model
+client = TestClient(app)
+
+
+class _RejectingQueue:
+    """Stands in for the batch queue; no batch worker runs here, so a queued request would hang."""
+
+    async def put(self, item):
+        raise AssertionError("request reached the batch queue")
+
+
+@pytest.fixture(autouse=True)
+def no_batch_worker(monkeypatch):
+    monkeypatch.setattr(fraud_detection, "batch_queue", _RejectingQueue())
+
+
+def _labelled_rows(labels: list) -> list:
+    """Rows the stand-in model scores as the given labels: all ones is fraud, all minus ones is not."""
+    return [[1.0 if label else -1.0] * N_FEATURES for label in labels]
+
+
+@contextmanager
+def _serving(monkeypatch, max_batch_rows: int):
+    """Run startup, which loads the stand-in model and starts the real batch worker.
+
+    The batch timeout is long, so a batch closes only once max_batch_rows rows have arrived.
+    """
+    monkeypatch.setattr(ai_config, "MAX_BATCH_SIZE", max_batch_rows)
+    monkeypatch.setattr(ai_config, "BATCH_TIMEOUT_MS", 10_000)
+    monkeypatch.setattr(fraud_detection, "batch_queue", asyncio.Queue())
+    fraud_detection.get_fraud_model.cache_clear()
+    try:
+        with TestClient(app) as served_client:
+            yield served_client
+    finally:
+        fraud_detection.get_fraud_model.cache_clear()
+
+
+def _post_concurrently(served_client, requests: list) -> list:
+    with ThreadPoolExecutor(max_workers=len(requests)) as pool:
+        return list(pool.map(lambda labels: served_client.post("/detect", json={"features": _labelled_rows(labels)}), requests))
+
+
+def test_parse_features_accepts_float_and_int_rows():
+    """Valid rows are converted to a float32 (batch, 30) array."""
+    rows = [[0.5] * N_FEATURES, list(range(N_FEATURES))]
+    features = _parse_features(json.dumps({"features": rows}).encode())
+
+    assert features.dtype == np.float32
+    np.testing.assert_array_equal(features, np.array(rows, dtype=np.float32))
+
+
+def test_parse_features_accepts_integers_beyond_64_bits():
+    """Integers simdjson cannot hold in 64 bits are still valid JSON numbers and are parsed as floats."""
+    rows = [[0.5] * N_FEATURES, [0] * (N_FEATURES - 1) + [10**25]]
+    features = _parse_features(json.dumps({"features": rows}).encode())
+
+    np.testing.assert_array_equal(features, np.array(rows, dtype=np.float32))
+
+
+@pytest.mark.parametrize(
+    "row",
+    [
+        [0.0] * (N_FEATURES - 2) + [[1.0], [2.0]],
+        [0.0] * (N_FEATURES - 1) + [[[7.0]]],
+        [0.0] * (N_FEATURES - 1) + [[]],
+        [0.0] * (N_FEATURES - 1) + [{"a": 1.0}],
+        [0.0] * (N_FEATURES - 1) + ["1.0"],
+        [0.0] * (N_FEATURES - 1) + [None],
+        [0.0] * (N_FEATURES - 1),
+        [0.0] * (N_FEATURES + 1),
+        [0.0] * (N_FEATURES - 2) + [10**25],
+        [0.0] * (N_FEATURES - 1) + [[10**25]],
+        [0.0] * (N_FEATURES - 1) + ["x" * 10**3, 10**25],
+    ],
+)
+def test_detect_rejects_invalid_rows(row):
+    """Rows that are not exactly 30 numbers are rejected before reaching the model."""
+    response = client.post("/detect", json={"features": [[0.0] * N_FEATURES, row]})
+
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"not json",
+        b"[]",
+        b'{"rows": []}',
+        b'{"features": []}',
+        b'{"features": 1}',
+        b'{"rows": [[100000000000000000000000000]]}',
+        b'{"features": [], "n": 100000000000000000000000000}',
+    ],
+)
+def test_detect_rejects_invalid_body(body):
+    """Malformed bodies return 422."""
+    response = client.post("/detect", content=body, headers={"Content-Type": "application/json"})
+
+    assert response.status_code == 422
+
+
+def test_detect_batches_concurrent_requests(onnx_path, monkeypatch):
+    """Concurrent requests of different sizes share one model call and each get their own labels."""
+    calls = []
+    predict = fraud_detection.FraudDetectionModel.predict
+
+    def _record(self, features):
+        calls.append(sum(len(rows) for rows in features))
+        return predict(self, features)
+
+    monkeypatch.setattr(fraud_detection.FraudDetectionModel, "predict", _record)
+    requests = [[(i + j) % 2 for j in range(i % 5 + 1)] for i in range(24)]
+    n_rows = sum(len(labels) for labels in requests)
+
+    with _serving(monkeypatch, max_batch_rows=n_rows) as served_client:
+        responses = _post_concurrently(served_client, requests)
+
+    assert [response.status_code for response in responses] == [200] * len(requests)
+    assert [response.json()["result"] for response in responses] == requests
+    assert calls == [n_rows]
+
+
+def test_detect_fails_every_request_in_a_failed_batch(onnx_path, monkeypatch):
+    """A model error is returned as 500 to every request that was batched with it."""
+    calls = []
+
+    def _fail(self, features):
+        calls.append(len(features))
+        raise RuntimeError("model failed")
+
+    monkeypatch.setattr(fraud_detection.FraudDetectionModel, "predict", _fail)
+    requests = [[1]] * 6
+
+    with _serving(monkeypatch, max_batch_rows=len(requests)) as served_client:
+        responses = _post_concurrently(served_client, requests)
+
+    assert [response.status_code for response in responses] == [500] * len(requests)
+    assert [response.json()["detail"] for response in responses] == ["model failed"] * len(requests)
+    assert calls == [len(requests)]
+
+
+def test_batch_worker_skips_cancelled_requests(monkeypatch):
+    """A request cancelled while queued gets no result, and the requests after it keep their own rows."""
+
+    class _EchoModel:
+        def predict(self, features):
+            return [int(value) for rows in features for value in rows[:, 0]]
+
+    async def _run():
+        queue = asyncio.Queue()
+        monkeypatch.setattr(fraud_detection, "batch_queue", queue)
+        monkeypatch.setattr(fraud_detection, "get_fraud_model", lambda: _EchoModel())
+
+        loop = asyncio.get_running_loop()
+        requests = [np.full((n_rows, N_FEATURES), label, dtype=np.float32) for n_rows, label in [(2, 1), (3, 7), (1, 4)]]
+        futures = [loop.create_future() for _ in requests]
+        for features, future in zip(requests, futures):
+            await queue.put((features, future))
+        futures[1].cancel()
+
+        worker = asyncio.create_task(fraud_detection._batch_worker())
+        try:
+            return await asyncio.wait_for(asyncio.gather(futures[0], futures[2]), timeout=10)
+        finally:
+            worker.cancel()
+
+    assert asyncio.run(_run()) == [[1, 1], [4]]
@@ -0,0 +1,229 @@
+"""Unit tests for FraudDetectionModel using a small stand-in ONNX model."""
+
+import threading
+from pathlib import Path
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+import pytest
+import tensorflow as tf
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from tensorflow import keras
+
+from src.core import fraud_model as fraud_model_module
+from src.core.fraud_model import MODEL_LOAD_ERRORS, N_FEATURES, FraudDetectionModel
+from src.utils import ai_config
+
+CHECK_CSV = Path(__file__).parent / "test.csv"
+
+
+@pytest.fixture
+def fraud_model(onnx_path) -> FraudDetectionModel:
+    return FraudDetectionModel()
+
+
+@pytest.fixture
+def served_paths(monkeypatch) -> list:
+    """Record the model paths ONNX Runtime sessions are created from; the last one is served."""
+    paths = []
+    create_session = FraudDetectionModel._create_onnx_session
+
+    def _record(onnx_path):
+        paths.append(onnx_path)
+        return create_session(onnx_path)
+
+    monkeypatch.setattr(FraudDetectionModel, "_create_onnx_session", staticmethod(_record))
+    return paths
+
+
+def test_predict_with_different_batch_sizes(fraud_model):
+    """Consecutive calls with different row counts each return one label per row."""
+    fraud_rows = np.ones((3, N_FEATURES), dtype=np.float32)
+    legit_rows = -np.ones((10, N_FEATURES), dtype=np.float32)
+
+    assert fraud_model.predict(fraud_rows) == [1] * 3
+    assert fraud_model.predict(legit_rows) == [0] * 10
+    assert fraud_model.predict(fraud_rows[:1]) == [1]
+
+
+def test_predict_concatenates_list_of_batches(fraud_model):
+    """A list of arrays is scored as one batch in order."""
+    batches = [np.ones((2, N_FEATURES), dtype=np.float32), -np.ones((1, N_FEATURES), dtype=np.float32)]
+
+    assert fraud_model.predict(batches) == [1, 1, 0]
+
+
+def test_load_model_redownloads_corrupt_onnx_model(onnx_path, downloads):
+    """A corrupt cached ONNX file triggers one forced re-download and the model then loads."""
+    with open(onnx_path, "wb") as f:
+        f.write(b"not an onnx model")
+
+    model = FraudDetectionModel()
+
+    assert len(downloads) == 1
+    assert model.predict(np.ones((1, N_FEATURES), dtype=np.float32)) == [1]
+
+
+def test_workers_share_one_redownload_of_corrupt_model(onnx_path, downloads, monkeypatch):
+    """Workers that all failed on the same corrupt files re-download them once between them."""
+    with open(onnx_path, "wb") as f:
+        f.write(b"not an onnx model")
+
+    n_workers = 3
+    all_failed = threading.Barrier(n_workers)
+    initialize_model = FraudDetectionModel.initialize_model
+
+    def _initialize_after_all_failed(self):
+        try:
+            initialize_model(self)
+        except MODEL_LOAD_ERRORS:
+            # Hold every worker until all of them have seen the corrupt files
+            all_failed.wait(timeout=10)
+            raise
+
+    monkeypatch.setattr(FraudDetectionModel, "initialize_model", _initialize_after_all_failed)
+    models = []
+    workers = [threading.Thread(target=lambda: models.append(FraudDetectionModel())) for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(downloads) == 1
+    assert [model.predict(np.ones((1, N_FEATURES), dtype=np.float32)) for model in models] == [[1]] * n_workers
+
+
+def test_export_reuses_model_exported_while_waiting_on_lock(tmp_path, monkeypatch):
+    """A worker that waited on the lock for another worker's export does not export again."""
+    model = FraudDetectionModel.__new__(FraudDetectionModel)
+    model.model_path = str(tmp_path)
+    other_worker_lock = model._model_lock()
+    other_worker_lock.acquire()
+
+    waiting = threading.Event()
+    model_lock = FraudDetectionModel._model_lock
+
+    class _SignallingLock:
+        def __init__(self, lock):
+            self._lock = lock
+
+        def __enter__(self):
+            waiting.set()
+            return self._lock.__enter__()
+
+        def __exit__(self, *exc_info):
+            return self._lock.__exit__(*exc_info)
+
+    def _fail_export(*args, **kwargs):
+        raise AssertionError("exported twice")
+
+    monkeypatch.setattr(FraudDetectionModel, "_model_lock", lambda self: _SignallingLock(model_lock(self)))
+    monkeypatch.setattr(fraud_model_module.subprocess, "run", _fail_export)
+    exported = []
+    worker = threading.Thread(target=lambda: exported.append(model._export_onnx_model()))
+    worker.start()
+
+    assert waiting.wait(timeout=10)
+    (tmp_path / "model.onnx").write_bytes(b"exported by the other worker")
+    other_worker_lock.release()
+    worker.join()
+
+    assert exported == [str(tmp_path / "model.onnx")]
+
+
+@pytest.fixture
+def quantize(onnx_path, monkeypatch) -> None:
+    """Enable INT8 quantization, checked against the bundled test samples."""
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE", True)
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_CHECK_CSV", str(CHECK_CSV))
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_MIN_AGREEMENT", 0.0)
+
+
+@pytest.fixture
+def agreement_checks(monkeypatch) -> list:
+    """Record every INT8 agreement check."""
+    checks = []
+    int8_agreement = FraudDetectionModel._int8_agreement
+
+    def _record(self, fp32_path, int8_path):
+        checks.append(int8_path)
+        return int8_agreement(self, fp32_path, int8_path)
+
+    monkeypatch.setattr(FraudDetectionModel, "_int8_agreement", _record)
+    return checks
+
+
+def test_quantized_model_keeps_input_layer_fp32(quantize, served_paths):
+    """The layer reading the raw features is excluded from INT8 quantization."""
+    FraudDetectionModel()
+
+    int8_path = served_paths[-1]
+    assert int8_path.endswith("model.int8.onnx")
+    consumers = [node for node in onnx.load(int8_path).graph.node if "input" in node.input]
+    assert [node.op_type for node in consumers] == ["MatMul"]
+
+
+def test_quantized_model_falls_back_to_fp32_on_disagreement(quantize, onnx_path, served_paths, monkeypatch):
+    """INT8 is only served when it passes the FP32 agreement check."""
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_MIN_AGREEMENT", 1.01)
+    FraudDetectionModel()
+
+    assert served_paths[-1] == onnx_path
+
+
+def test_quantize_requires_check_data(quantize, downloads, monkeypatch):
+    """Quantization without check data fails the boot instead of quietly serving FP32."""
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_CHECK_CSV", None)
+
+    with pytest.raises(ValueError, match="FRAUD_MODEL_QUANTIZE_CHECK_CSV"):
+        FraudDetectionModel()
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_CHECK_CSV", "missing.csv")
+    with pytest.raises(FileNotFoundError):
+        FraudDetectionModel()
+    assert downloads == []
+
+
+def test_quantized_model_and_agreement_are_cached(quantize, agreement_checks, served_paths, tmp_path, monkeypatch):
+    """A cached INT8 model is reused with its recorded agreement until the check data changes."""
+    FraudDetectionModel()
+    FraudDetectionModel()
+    assert len(agreement_checks) == 1
+    assert served_paths[-1].endswith("model.int8.onnx")
+
+    fewer_rows = tmp_path / "check.csv"
+    fewer_rows.write_text("".join(CHECK_CSV.read_text().splitlines(keepends=True)[:11]))
+    monkeypatch.setattr(ai_config, "FRAUD_MODEL_QUANTIZE_CHECK_CSV", str(fewer_rows))
+    FraudDetectionModel()
+    assert len(agreement_checks) == 2
+
+
+def test_stale_quantized_model_is_rebuilt(quantize, onnx_path, agreement_checks, served_paths, tmp_path):
+    """An INT8 file with no matching report, such as one quantized with the input layer, is rebuilt."""
+    quantize_dynamic(onnx_path, str(tmp_path / "model.int8.onnx"), weight_type=QuantType.QInt8)
+    FraudDetectionModel()
+
+    assert len(agreement_checks) == 1
+    consumers = [node for node in onnx.load(served_paths[-1]).graph.node if "input" in node.input]
+    assert [node.op_type for node in consumers] == ["MatMul"]
+
+
+def test_export_onnx_model_matches_saved_model(tmp_path):
+    """The SavedModel serving signature is exported to ONNX with the same outputs."""
+    inputs = keras.Input(shape=(N_FEATURES,))
+    hidden = keras.layers.Dense(8, activation="relu")(inputs)
+    keras.Model(inputs, keras.layers.Dense(1, activation="sigmoid")(hidden)).export(str(tmp_path))
+
+    # Only the export step is exercised, so skip __init__ and its download/load
+    model = FraudDetectionModel.__new__(FraudDetectionModel)
+    model.model_path = str(tmp_path)
+    onnx_path = model._export_onnx_model()
+
+    features = np.random.default_rng(0).normal(size=(4, N_FEATURES)).astype(np.float32)
+    serving_fn = tf.saved_model.load(str(tmp_path)).signatures["serving_default"]
+    (input_key, _), = serving_fn.structured_input_signature[1].items()
+    expected = next(iter(serving_fn(**{input_key: tf.constant(features)}).values())).numpy()
+    sess = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    actual = sess.run(None, {sess.get_inputs()[0].name: features})[0]
+
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)